@@ -3,6 +3,11 @@ from typing import Any, Union
 import yaml
 from pydantic import TypeAdapter
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper  # type: ignore
+
 # Імпорти моделей
 from posprinter.models import (
     CheckStatusResponse,
@@ -18,31 +23,23 @@ ResponseModel = Union[
 ]
 
 
-def sanitize_schema(obj: Any) -> Any:
+def sanitize_schema(root: Any) -> None:
     """
-    Рекурсивно чистить схему від Pydantic-специфічних полів,
+    Чистить схему на місці від Pydantic-специфічних полів,
     які ламають AsyncAPI валідатори (зокрема discriminator).
+    Обхід ітеративний через стек, нові списки/словники не створюються.
     """
-    if isinstance(obj, dict):
-        # 1. Видаляємо discriminator, бо Pydantic робить його об'єктом,
-        # а AsyncAPI часто хоче string або інший формат.
-        # Це головна причина помилки "discriminator property type must be string".
-        if "discriminator" in obj:
-            del obj["discriminator"]
-
-        # 2. Видаляємо title, якщо він просто дублює назву (не обов'язково, але чистіше)
-        # if "title" in obj:
-        #    del obj["title"]
-
-        # Рекурсія по словнику
-        for key, value in obj.items():
-            obj[key] = sanitize_schema(value)
-
-    elif isinstance(obj, list):
-        # Рекурсія по списку
-        return [sanitize_schema(item) for item in obj]
-
-    return obj
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            # Видаляємо discriminator, бо Pydantic робить його об'єктом,
+            # а AsyncAPI часто хоче string або інший формат.
+            # Це головна причина помилки "discriminator property type must be string".
+            node.pop("discriminator", None)
+            stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
 
 
 def generate_asyncapi():
@@ -73,7 +70,7 @@ def generate_asyncapi():
 
     # !!! НАЙВАЖЛИВІШИЙ ЕТАП: ЧИСТИМО СХЕМИ !!!
     # Це прибере помилки валідації
-    clean_schemas = sanitize_schema(all_schemas)
+    sanitize_schema(all_schemas)
 
     asyncapi_spec = {
         "asyncapi": "3.0.0",
@@ -112,7 +109,7 @@ def generate_asyncapi():
             },
         },
         "components": {
-            "schemas": clean_schemas,
+            "schemas": all_schemas,
             "messages": {
                 "ClientRequest": {
                     "name": "ClientRequest",
@@ -128,8 +125,16 @@ def generate_asyncapi():
         },
     }
 
-    with open("asyncapi.yaml", "w", encoding="utf-8") as f:
-        yaml.dump(asyncapi_spec, f, allow_unicode=True, sort_keys=False)
+    # libyaml сам кодує в utf-8, тому пишемо одразу байти
+    with open("asyncapi.yaml", "wb") as f:
+        yaml.dump(
+            asyncapi_spec,
+            f,
+            Dumper=SafeDumper,
+            encoding="utf-8",
+            allow_unicode=True,
+            sort_keys=False,
+        )
 
     print("Файл asyncapi.yaml готовий. Спробуй тепер, має бути чисто.")
 
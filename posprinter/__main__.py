@@ -11,12 +11,16 @@ if sys.stdout.encoding.lower() != "utf-8":
 
 warnings.simplefilter("ignore")
 
-_REAL_STDOUT = sys.stdout
+# Бінарний stdout: JSON пишемо байтами прямо в дескриптор, повз io-шар
+_REAL_STDOUT = sys.stdout.buffer
+_REAL_STDOUT_FD = _REAL_STDOUT.fileno()
 sys.stdout = sys.stderr
 
-import json  # noqa: E402
+import io  # noqa: E402
 import logging  # noqa: E402
+import os  # noqa: E402
 import traceback  # noqa: E402
+from typing import Callable, Dict, Iterator  # noqa: E402
 
 from pydantic import TypeAdapter, ValidationError  # noqa: E402
 
@@ -37,34 +41,86 @@ from posprinter.models import (  # noqa: E402
 
 logging.basicConfig(stream=sys.stderr, level=logging.ERROR)
 
+# Схема будується один раз, а не на кожен запит
+_REQ_ADAPTER = TypeAdapter(RequestModel)
+
+# Traceback форматуємо тільки в debug-режимі, це дорого і клієнту зазвичай не треба
+_DEBUG = os.environ.get("POSPRINTER_DEBUG") == "1"
+
+
+def _encode_model(response_model: BaseResponse) -> bytes:
+    # Використовуємо Pydantic для дампа в JSON, блядь
+    # pydantic-core (Rust) одразу віддає utf-8 байти
+    json_bytes = response_model.__pydantic_serializer__.to_json(
+        response_model, exclude_none=True
+    )
+    return json_bytes + b"\n"
+
+
+# Голий success не має полів, крім status - відповідь завжди однакова
+_SUCCESS_LINE = b'{"status":"success"}\n'
+
+# Спеціалізовані енкодери по точному типу відповіді, решта через pydantic-core
+_ENCODERS: Dict[type, Callable[[BaseResponse], bytes]] = {
+    SuccessResponse: lambda response_model: _SUCCESS_LINE,
+}
+
 
 def send_response(response_model: BaseResponse):
     try:
-        # Використовуємо Pydantic для дампа в JSON, блядь
-        json_str = response_model.model_dump_json(exclude_none=True)
-        _REAL_STDOUT.write(json_str + "\n")
-        _REAL_STDOUT.flush()
+        encode = _ENCODERS.get(type(response_model), _encode_model)
+        # Один os.write на відповідь; цикл на випадок часткового запису в pipe
+        view = memoryview(encode(response_model))
+        while view:
+            written = os.write(_REAL_STDOUT_FD, view)
+            view = view[written:]
     except Exception as e:
         # Якщо навіть це впало, то ти повний ідіот
         sys.stderr.write(f"CRITICAL JSON ERROR: {e}\n")
 
 
+def iter_stdin_lines(buffer_size: int = 65536) -> Iterator[bytes]:
+    """
+    Читає stdin сирими байтами великими шматками і віддає готові рядки по \\n.
+    Хвіст без \\n переноситься в наступний шматок.
+    read1() не чекає заповнення буфера, тому відповідь йде одразу.
+    """
+    reader = io.BufferedReader(sys.stdin.buffer.raw, buffer_size=buffer_size)
+    pending = bytearray()
+    while True:
+        chunk = reader.read1(buffer_size)
+        if not chunk:
+            break
+
+        # Шукаємо \n тільки в новому шматку, старий хвіст уже перевірений
+        search_from = len(pending)
+        pending += chunk
+        end = pending.rfind(b"\n", search_from)
+        if end == -1:
+            continue
+
+        yield from bytes(pending[:end]).split(b"\n")
+        del pending[: end + 1]
+
+    if pending:
+        yield bytes(pending)
+
+
 def main():
     service = get_service()
     sys.stderr.write("Printer Daemon CLI Ready.\n")
     sys.stderr.flush()
     try:
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
+        for line in iter_stdin_lines():
+            if not line.strip():
                 continue
 
             response = {}
             try:
-                request = TypeAdapter(RequestModel).validate_json(line)
+                request = _REQ_ADAPTER.validate_json(line)
 
                 if isinstance(request, GetPrintersRequest):
-                    printers_list = service.get_printers()
+                    printers_list = service.get_printers(request.force_refresh)
                     response = GetPrintersResponse(data=printers_list)
 
                 elif isinstance(request, CheckStatusRequest):
@@ -88,15 +144,19 @@ def main():
                     )
 
             except ValidationError as e:
+                # Без input: рядок приходить як bytes, і невалідний UTF-8 в ньому
+                # не серіалізується - клієнт лишився б без відповіді
                 response = ErrorResponse(
-                    error="Validation Error", details=json.loads(e.json())
+                    error="Validation Error", details=e.errors(include_input=False)
                 )
             except OSError as e:
                 response = ErrorResponse(
                     error="Printer Error", message=f"{e.__class__.__name__}: {str(e)}"
                 )
             except Exception as e:
-                trace = traceback.format_exc()
+                trace = None
+                if _DEBUG or logging.getLogger().isEnabledFor(logging.DEBUG):
+                    trace = traceback.format_exc()
                 response = ErrorResponse(
                     error="System Error",
                     message=f"{e.__class__.__name__}: {str(e)}",
@@ -1,48 +1,66 @@
+from functools import lru_cache
+
 from escpos.printer import Escpos
 from PIL import Image, ImageDraw, ImageFont
 
+from posprinter.printer import raster_command
+
 ROW_HEIGHT = 40
 FONT_SIZE = 20
 BAR_THICKNESS = 6
 LINE_THICKNESS = 2
 
+# Reset + вирівнювання по центру
+HEADER_PREFIX = b"\x1b\x40" + b"\x1b\x61\x01"
 
-def print_calibration_image(p: Escpos, start: int, end: int, step: int) -> None:
-    p._raw(b"\x1b\x40")  # Reset
-    p.set(align="center")  # Centered
-
-    p._raw(b"--- IMAGE WIDTH CALIBRATION ---\n")
-    p._raw(f"Range: {start}-{end} px\n".encode("cp866"))
-    p._raw(b"Find the widest line\n")
-    p._raw(b"with visible BOTH bars |\n\n")
 
+@lru_cache(maxsize=8)
+def _load_font(size: int) -> ImageFont.ImageFont:
     try:
-        font = ImageFont.truetype("arialbd.ttf", FONT_SIZE)
+        return ImageFont.truetype("arialbd.ttf", size)
     except IOError:
         try:
-            font = ImageFont.truetype("arial.ttf", FONT_SIZE)
+            return ImageFont.truetype("arial.ttf", size)
         except IOError:
-            font = ImageFont.load_default()
+            return ImageFont.load_default()
+
+
+def print_calibration_image(p: Escpos, start: int, end: int, step: int) -> None:
+    # Заголовок одним _raw замість купи дрібних записів
+    header = bytearray(HEADER_PREFIX)
+    header += b"--- IMAGE WIDTH CALIBRATION ---\n"
+    header += f"Range: {start}-{end} px\n".encode("cp866")
+    header += b"Find the widest line\n"
+    header += b"with visible BOTH bars |\n\n"
+    p._raw(bytes(header))
+
+    font = _load_font(FONT_SIZE)
+
+    widths = list(range(start, end + 1, step))
 
-    for width in range(start, end + 1, step):
+    # Всі рядки складаємо в одну високу картинку і шлемо одним растром.
+    # Вузькі рядки центруємо на білому полотні - як раніше робило ESC a 1.
+    max_w = max(widths, default=0)
+    sheet = Image.new("1", (max_w, ROW_HEIGHT * len(widths)), 1)
+
+    for row_index, width in enumerate(widths):
         img = Image.new("1", (width, ROW_HEIGHT), 1)
         draw = ImageDraw.Draw(img)
 
-        x_start = 0
-        x_end = width - 1
-
-        y_top = 0
-        y_bottom = ROW_HEIGHT - 1
         y_mid = ROW_HEIGHT // 2
+        line_top = y_mid - (LINE_THICKNESS - 1) // 2
+
+        # Заливаємо області через paste(колір, box) - одна C-операція на регіон,
+        # без растеризації примітивів ImageDraw. Box тут з виключним кінцем.
 
         # 1. Horizontal line
-        draw.line([(x_start, y_mid), (x_end, y_mid)], fill=0, width=LINE_THICKNESS)
+        img.paste(0, (0, line_top, width, line_top + LINE_THICKNESS))
 
         # 2. Left bar
-        draw.rectangle([x_start, y_top, x_start + BAR_THICKNESS, y_bottom], fill=0)
+        img.paste(0, (0, 0, BAR_THICKNESS + 1, ROW_HEIGHT))
 
         # 3. Right bar
-        draw.rectangle([x_end - BAR_THICKNESS, y_top, x_end, y_bottom], fill=0)
+        img.paste(0, (width - 1 - BAR_THICKNESS, 0, width, ROW_HEIGHT))
 
         # Text
         text = f"{width}"
@@ -60,15 +78,22 @@ def print_calibration_image(p: Escpos, start: int, end: int, step: int) -> None:
 
         # 4. white rectangle background
         pad = 6
-        draw.rectangle(
-            [text_x - pad, y_top + 4, text_x + w + pad, y_bottom - 4], fill=1
+        img.paste(
+            1,
+            (
+                max(0, text_x - pad),
+                4,
+                min(width, text_x + w + pad + 1),
+                ROW_HEIGHT - 4,
+            ),
         )
 
         # 5. Text
         draw.text((text_x, text_y), text, font=font, fill=0)
 
-        # Print image
-        p.image(img, impl="bitImageRaster")
+        sheet.paste(img, ((max_w - width) // 2, row_index * ROW_HEIGHT))
 
+    if widths:
+        p._raw(raster_command(sheet))
     p._raw(b"\n\n\n")
     p.cut(mode="PART")
@@ -1,36 +1,43 @@
 from escpos.printer import Escpos
 
+# Reset + кодова сторінка CP866 + вирівнювання по центру
+HEADER_PREFIX = b"\x1b\x40" + b"\x1b\x74\x11" + b"\x1b\x61\x01"
+
+# ASCII однаковий у cp866, тому лінійки збираємо одразу в байтах
+OPEN = b"["
+CLOSE = b"]\n"
+LT = b"<"
+GT = b">"
+
 
 def print_calibration_text(p: Escpos, start: int, end: int, step: int) -> None:
-    p._raw(b"\x1b\x40")
-    p._raw(b"\x1b\x74\x11")
-    p.set(align="center")
+    # Збираємо весь чек в один буфер і шлемо одним _raw
+    buf = bytearray(HEADER_PREFIX)
 
-    p._raw(b"--- TEXT CALIBRATION ---\n\n")
+    buf += b"--- TEXT CALIBRATION ---\n\n"
 
-    p._raw(b"1. PRINTER LIMIT (Total Chars) \n")
-    p._raw(b"Find the MAX number that stays \n")
-    p._raw(b"on ONE single line.            \n")
-    p._raw(b"(If it splits/wraps -> Too Big)\n\n")
+    buf += b"1. PRINTER LIMIT (Total Chars) \n"
+    buf += b"Find the MAX number that stays \n"
+    buf += b"on ONE single line.            \n"
+    buf += b"(If it splits/wraps -> Too Big)\n\n"
 
-    p._raw(b"2. PAPER LIMIT (Paper Width)   \n")
-    p._raw(b"Find the MAX number where      \n")
-    p._raw(b"you see BOTH brackets [ ]      \n")
-    p._raw(b"(If bracket is gone -> Too Big)\n\n")
+    buf += b"2. PAPER LIMIT (Paper Width)   \n"
+    buf += b"Find the MAX number where      \n"
+    buf += b"you see BOTH brackets [ ]      \n"
+    buf += b"(If bracket is gone -> Too Big)\n\n"
 
-    p._raw(b"--------------------------------\n\n")
+    buf += b"--------------------------------\n\n"
 
     for width in range(start, end, step):
-        label = f" {width} "
+        label = f" {width} ".encode("ascii")
 
         available = width - 2 - len(label)
 
         left_len = available // 2
         right_len = available - left_len
 
-        line = f"[{'<' * left_len}{label}{'>' * right_len}]\n"
-
-        p._raw(line.encode("cp866"))
+        buf += OPEN + LT * left_len + label + GT * right_len + CLOSE
 
-    p._raw(b"\n\n\n")
+    buf += b"\n\n\n"
+    p._raw(bytes(buf))
     p.cut(mode="PART")
@@ -1,4 +1,7 @@
-from typing import Dict, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 
 try:
     import win32print
@@ -17,21 +20,80 @@ from posprinter.models import (
 )
 from posprinter.printer import PrinterHandler
 
+# Скільки секунд тримаємо список принтерів з EnumPrinters
+PRINTERS_CACHE_TTL = 5.0
+
+# Через скільки секунд простою закриваємо з'єднання з принтером
+HANDLER_IDLE_TIMEOUT = 60.0
+
 
 class PrinterService:
     def __init__(self):
         # Кеш хендлерів: Key -> PrinterHandler
         self._handlers: Dict[str, PrinterHandler] = {}
-
-    def _get_handler(self, config: ConnectionConfig) -> PrinterHandler:
+        # Кеш EnumPrinters: (time.monotonic(), список)
+        self._printers_cache: Optional[Tuple[float, List[PrinterInfo]]] = None
+        # Коли хендлер останній раз використовувався: Key -> time.monotonic()
+        self._last_used: Dict[str, float] = {}
+        # Хендлер не можна закривати, поки ним друкує запит
+        self._lock = threading.RLock()
+        self._reaper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _resource_key(config: ConnectionConfig) -> str:
         if config.type == "serial":
-            resource_key = f"serial:{config.port}"
+            return f"serial:{config.port}"
         elif config.type == "windows":
-            resource_key = f"windows:{config.printer_name}"
+            return f"windows:{config.printer_name}"
         elif config.type == "dummy":
-            resource_key = "dummy"
+            return "dummy"
         else:
-            resource_key = f"network:{config.host}:{config.port}"
+            return f"network:{config.host}:{config.port}"
+
+    @contextmanager
+    def _use_handler(self, config: ConnectionConfig) -> Iterator[PrinterHandler]:
+        with self._lock:
+            resource_key = self._resource_key(config)
+            try:
+                yield self._get_handler(config)
+            finally:
+                if resource_key in self._handlers:
+                    self._last_used[resource_key] = time.monotonic()
+                self._start_reaper()
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+
+        self._reaper = threading.Thread(
+            target=self._reap_idle_loop, name="printer-idle-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap_idle_loop(self):
+        while True:
+            time.sleep(HANDLER_IDLE_TIMEOUT / 2)
+            self.close_idle()
+
+    def close_idle(self):
+        # Не тримаємо COM-порт/сокет вічно, якщо запитів давно не було
+        with self._lock:
+            now = time.monotonic()
+            for key, last_used in list(self._last_used.items()):
+                if now - last_used < HANDLER_IDLE_TIMEOUT:
+                    continue
+
+                del self._last_used[key]
+                handler = self._handlers.pop(key, None)
+                if handler is None:
+                    continue
+                try:
+                    handler.close()
+                except Exception:
+                    pass
+
+    def _get_handler(self, config: ConnectionConfig) -> PrinterHandler:
+        resource_key = self._resource_key(config)
 
         if resource_key in self._handlers:
             handler = self._handlers[resource_key]
@@ -48,19 +110,28 @@ class PrinterService:
         return handler
 
     def close_all(self):
-        for h in self._handlers.values():
-            try:
-                h.close()
-            except Exception:
-                pass
-        self._handlers.clear()
+        with self._lock:
+            for h in self._handlers.values():
+                try:
+                    h.close()
+                except Exception:
+                    pass
+            self._handlers.clear()
+            self._last_used.clear()
 
     # --- API Methods ---
 
-    def get_printers(self) -> List[PrinterInfo]:
+    def get_printers(self, force_refresh: bool = False) -> List[PrinterInfo]:
         if not win32print:
             raise RuntimeError("win32print module is not available.")
 
+        # EnumPrinters може висіти сотні мс на мережевих чергах,
+        # а список майже не міняється
+        if self._printers_cache is not None and not force_refresh:
+            cached_at, cached = self._printers_cache
+            if time.monotonic() - cached_at < PRINTERS_CACHE_TTL:
+                return cached
+
         data = []
         flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
         printers = win32print.EnumPrinters(flags)
@@ -69,36 +140,43 @@ class PrinterService:
             info = PrinterInfo(name=str(p[2]), port=str(p[1]), driver=str(p[3]))
             data.append(info)
 
+        self._printers_cache = (time.monotonic(), data)
         return data
 
     def check_status(self, config: ConnectionConfig) -> PrinterStatusData:
-        handler = self._get_handler(config)
-        try:
-            return handler.get_status()
-        except OSError:
-            handler.reconnect()
-            return handler.get_status()
+        with self._use_handler(config) as handler:
+            try:
+                return handler.get_status()
+            except OSError:
+                handler.reconnect()
+                return handler.get_status()
 
     def print_job(self, request: PrintJobRequest) -> None:
-        handler = self._get_handler(request.connection)
-        try:
-            for task in request.tasks:
-                handler.process_task(task, request.profile)
-        except (OSError, RuntimeError) as e:
-            handler.close()
-            raise e
+        with self._use_handler(request.connection) as handler:
+            try:
+                for task in request.tasks:
+                    handler.process_task(task, request.profile)
+                handler.flush()
+            except (OSError, RuntimeError) as e:
+                handler.close()
+                raise e
+            except Exception:
+                # Помилка в даних задачі: з'єднання живе, але шматок цього чека
+                # не повинен потрапити на початок наступного
+                handler.discard()
+                raise
 
     def print_calibration_image(self, request: PrintCalibrationImageRequest) -> None:
-        handler = self._get_handler(request.connection)
-        p = handler.p
-        print_calibration_image(p, request.start, request.end, request.step)
-        handler.close()
+        with self._use_handler(request.connection) as handler:
+            p = handler.p
+            print_calibration_image(p, request.start, request.end, request.step)
+            handler.close()
 
     def print_calibration_text(self, request: PrintCalibrationTextRequest) -> None:
-        handler = self._get_handler(request.connection)
-        p = handler.p
-        print_calibration_text(p, request.start, request.end, request.step)
-        handler.close()
+        with self._use_handler(request.connection) as handler:
+            p = handler.p
+            print_calibration_text(p, request.start, request.end, request.step)
+            handler.close()
 
 
 _service_instance = PrinterService()
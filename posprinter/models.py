@@ -1,6 +1,47 @@
+import binascii
+import os
+from functools import cached_property
 from typing import Annotated, Any, List, Literal, Optional, TypeVar, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, EncodedBytes, Field, field_validator, model_validator
+from pydantic.types import Base64Encoder, EncoderProtocol
+from pydantic_core import PydanticCustomError
+
+
+class FastBase64Encoder(Base64Encoder):
+    # a2b_base64 напряму, без обгортки base64.b64decode
+    @classmethod
+    def decode(cls, data: bytes) -> bytes:
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error as e:
+            raise PydanticCustomError(
+                "base64_decode", "Base64 decoding error: '{error}'", {"error": str(e)}
+            )
+
+
+class HexEncoder(EncoderProtocol):
+    # Hex з пробілами між байтами ("1b 40") -> bytes, один раз при валідації
+    @classmethod
+    def decode(cls, data: bytes) -> bytes:
+        try:
+            return bytes.fromhex(data.replace(b" ", b"").decode("ascii"))
+        except ValueError as e:
+            raise PydanticCustomError(
+                "hex_decode", "Hex decoding error: '{error}'", {"error": str(e)}
+            )
+
+    @classmethod
+    def encode(cls, value: bytes) -> bytes:
+        return value.hex().encode("ascii")
+
+    @classmethod
+    def get_json_format(cls) -> str:
+        return "hex"
+
+
+Base64Payload = Annotated[bytes, EncodedBytes(encoder=FastBase64Encoder)]
+HexPayload = Annotated[bytes, EncodedBytes(encoder=HexEncoder)]
 
 # --- DATA MODELS  ---
 
@@ -40,12 +81,30 @@ class TableTask(BaseTask):
 
 class ImageTask(BaseTask):
     type: Literal["image"]
-    data: str  # Base64 string
+    data: Optional[Base64Payload] = None  # Base64 string, Pydantic декодує в bytes
+    path: Optional[str] = None  # Локальний файл, читається без Base64
+
+    @field_validator("path")
+    @classmethod
+    def _check_path(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and not os.path.isfile(v):
+            raise PydanticCustomError(
+                "image_path", "Image file not found: '{path}'", {"path": v}
+            )
+        return v
+
+    @model_validator(mode="after")
+    def _check_source(self):
+        if (self.data is None) == (self.path is None):
+            raise PydanticCustomError(
+                "image_source", "Exactly one of 'data' or 'path' must be set"
+            )
+        return self
 
 
 class PdfTask(BaseTask):
     type: Literal["pdf"]
-    data: str  # Base64 string
+    data: Base64Payload  # Base64 string, Pydantic декодує в bytes
 
 
 class FeedTask(BaseModel):
@@ -59,7 +118,7 @@ class CutTask(BaseModel):
 
 class RawTask(BaseModel):
     type: Literal["raw"]
-    hex_data: str
+    hex_data: HexPayload  # Hex string, Pydantic декодує в bytes
 
 
 PrintTask = Annotated[
@@ -113,6 +172,11 @@ class PrinterProfile(BaseModel):
     encoding: str = "cp1251"
     codepage_id: int | None = None
 
+    @cached_property
+    def margin_base(self) -> int:
+        # Відступ зліва, щоб робоча область була по центру фізичного рядка
+        return max(0, (self.printer_total_chars - self.paper_width_chars) // 2)
+
 
 class PrintJobRequest(BaseModel):
     action: Literal["print"]
@@ -124,6 +188,7 @@ class PrintJobRequest(BaseModel):
 
 class GetPrintersRequest(BaseModel):
     action: Literal["get_printers"]
+    force_refresh: bool = False  # Ігнорувати кеш і перечитати список
     # Це працює тільки для Windows драйверів, для Network/Serial сканування писати не буду, йди в сраку
 
 
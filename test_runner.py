@@ -1,10 +1,12 @@
+import asyncio
 import base64
 import json
 import os
-import queue
-import subprocess
-import threading
-import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
 
 # --- 1. НАЛАШТУВАННЯ ПІДКЛЮЧЕННЯ ---
 
@@ -38,6 +40,7 @@ PRINTER_SETUP = {
 
 IMAGE_FILENAME = "rec.png"  # Назва файлу поруч зі скриптом
 PDF_FILENAME = "TEST_kzDbXXeB9OvI5Q.pdf"  # Назва PDF файлу поруч зі скриптом
+DAEMON_IS_LOCAL = True  # False - демон на іншій машині, картинка йде як Base64
 
 # --- 2. ДОПОМІЖНІ ФУНКЦІЇ ---
 
@@ -53,35 +56,36 @@ def image_to_base64(path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 
-def enqueue_output(out, q):
-    """Читає потік у фоні, щоб не блокувати головний процес"""
-    try:
-        for line in iter(out.readline, b""):
-            q.put(line)
-    except ValueError:
-        pass
-    out.close()
-
-
-def read_response_with_timeout(process, q_stdout, q_stderr, timeout=5):
-    """Читає відповідь з таймаутом"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        # Перевірка STDERR
-        try:
-            err_line = q_stderr.get_nowait()
-            print(f"❌ [STDERR]: {err_line.decode('utf-8', errors='replace').strip()}")
-        except queue.Empty:
-            pass
+def dumps_line(payload):
+    """JSON-рядок запиту одразу в байтах (orjson, якщо встановлений)"""
+    if orjson:
+        return orjson.dumps(payload) + b"\n"
+    return (json.dumps(payload) + "\n").encode("utf-8")
+
+
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+async def drain_stderr(stream):
+    """Друкує STDERR демона одразу, як тільки рядок прийшов"""
+    async for line in stream:
+        print(f"❌ [STDERR]: {line.decode('utf-8', errors='replace').strip()}")
+
+
+async def send_request(process, payload):
+    process.stdin.write(dumps_line(payload))
+    await process.stdin.drain()
 
-        # Перевірка STDOUT
-        try:
-            line = q_stdout.get_nowait()
-            return line
-        except queue.Empty:
-            time.sleep(0.1)
 
-    raise TimeoutError(f"No response within {timeout} seconds.")
+async def read_response_with_timeout(process, timeout=5):
+    """Читає один рядок відповіді з таймаутом"""
+    try:
+        return await asyncio.wait_for(process.stdout.readline(), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"No response within {timeout} seconds.")
 
 
 def safe_log_response(byte_line):
@@ -89,56 +93,49 @@ def safe_log_response(byte_line):
     if not byte_line:
         print("<<< [EMPTY RESPONSE]")
         return
-    text = byte_line.decode("utf-8", errors="replace").strip()
     try:
-        data = json.loads(text)
+        data = loads(byte_line)
         print(json.dumps(data, indent=2, ensure_ascii=False))
         if data.get("status") == "error":
             print(f"⚠️  ERROR DETAILS: {data.get('error')}")
-    except json.JSONDecodeError:
+    # orjson.JSONDecodeError - підклас json.JSONDecodeError
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        text = byte_line.decode("utf-8", errors="replace").strip()
         print(f"<<< [RAW]: {text}")
 
 
 # --- 3. ГОЛОВНА ЛОГІКА ---
 
 
-def run_test():
+async def run_test():
     print(">>> 🚀 Запускаємо демона (posprinter)...")
 
     # Запускаємо модуль як підпроцес
-    process = subprocess.Popen(
-        ["uv", "run", "python", "-m", "posprinter"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        bufsize=0,
+    # (під Windows стандартний ProactorEventLoop теж вміє pipe-и підпроцесів)
+    process = await asyncio.create_subprocess_exec(
+        "uv",
+        "run",
+        "python",
+        "-m",
+        "posprinter",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
     )
 
-    # Запускаємо потоки читання
-    q_stdout = queue.Queue()
-    q_stderr = queue.Queue()
-
-    t_out = threading.Thread(target=enqueue_output, args=(process.stdout, q_stdout))
-    t_out.daemon = True
-    t_out.start()
-
-    t_err = threading.Thread(target=enqueue_output, args=(process.stderr, q_stderr))
-    t_err.daemon = True
-    t_err.start()
+    stderr_task = asyncio.create_task(drain_stderr(process.stderr))
 
     try:
-        time.sleep(1)  # Прогрів
+        await asyncio.sleep(1)  # Прогрів
 
         # === ТЕСТ 1: STATUS ===
         req_status = {"action": "check_status", "connection": CONNECTION_CONFIG}
         print("\n>>> [1] Checking Status...")
 
-        msg = json.dumps(req_status) + "\n"
-        process.stdin.write(msg.encode("utf-8"))
-        process.stdin.flush()
+        await send_request(process, req_status)
 
         try:
-            resp = read_response_with_timeout(process, q_stdout, q_stderr, timeout=5)
+            resp = await read_response_with_timeout(process, timeout=5)
             safe_log_response(resp)
         except TimeoutError:
             print("⏰ Timeout on Status Check")
@@ -147,7 +144,12 @@ def run_test():
         print("\n>>> [2] Preparing Receipt...")
 
         # 1. Беремо картинку
-        img_data = image_to_base64(IMAGE_FILENAME)
+        if DAEMON_IS_LOCAL and os.path.exists(IMAGE_FILENAME):
+            # Демон бачить наш файл -> шлях, без Base64 туди-назад
+            img_task = {"type": "image", "path": os.path.abspath(IMAGE_FILENAME)}
+        else:
+            # Віддалений демон або файлу нема (тоді тестовий квадрат)
+            img_task = {"type": "image", "data": image_to_base64(IMAGE_FILENAME)}
         pdf_data = image_to_base64(PDF_FILENAME)
 
         # 2. Формуємо запит (Згідно з новим Pydantic models)
@@ -161,10 +163,7 @@ def run_test():
             },
             "tasks": [
                 # Заголовок
-                {
-                    "type": "image",
-                    "data": img_data,
-                },
+                img_task,
                 {"type": "cut"},
                 {
                     "type": "pdf",
@@ -203,30 +202,32 @@ def run_test():
         }
 
         print(">>> Sending Print Job...")
-        msg = json.dumps(req_print) + "\n"
-        process.stdin.write(msg.encode("utf-8"))
-        process.stdin.flush()
+        await send_request(process, req_print)
         print(">>> Print Job Sent. Awaiting response...")
         print(json.dumps(req_print, indent=2, ensure_ascii=False))
 
         try:
             # На друк даємо більше часу
-            resp = read_response_with_timeout(process, q_stdout, q_stderr, timeout=15)
+            resp = await read_response_with_timeout(process, timeout=15)
             safe_log_response(resp)
         except TimeoutError:
             print("⏰ Timeout on Print Job")
 
-    except KeyboardInterrupt:
-        print("\n🛑 Interrupted by user")
     finally:
         print("\n>>> ☠️ Stopping process...")
-        process.terminate()
+        if process.returncode is None:
+            process.terminate()
         try:
-            process.wait(timeout=2)
-        except:
+            await asyncio.wait_for(process.wait(), 2)
+        except asyncio.TimeoutError:
             process.kill()
+            await process.wait()
+        await stderr_task
         print(">>> Done.")
 
 
 if __name__ == "__main__":
-    run_test()
+    try:
+        asyncio.run(run_test())
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted by user")
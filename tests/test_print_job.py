@@ -0,0 +1,70 @@
+import unittest
+
+from pydantic import TypeAdapter
+
+from posprinter.core import PrinterService
+from posprinter.models import PrintJobRequest
+
+_JOB_ADAPTER = TypeAdapter(PrintJobRequest)
+
+
+def make_job(tasks):
+    return _JOB_ADAPTER.validate_python(
+        {
+            "action": "print",
+            "connection": {"type": "dummy"},
+            "profile": {"printer_total_chars": 48, "paper_width_chars": 48},
+            "tasks": tasks,
+        }
+    )
+
+
+class PrintJobFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.service = PrinterService()
+
+    def tearDown(self):
+        self.service.close_all()
+
+    def test_failed_job_does_not_leak_into_next_job(self):
+        # OverflowError у TableTask - не OSError/RuntimeError, з'єднання не закривається
+        failing = make_job(
+            [
+                {"type": "text", "value": "STALE-FROM-JOB-1"},
+                {"type": "table", "data": [["a", "b"]], "columns_ratio": [1e308, 1]},
+            ]
+        )
+        with self.assertRaises(OverflowError):
+            self.service.print_job(failing)
+
+        (handler,) = self.service._handlers.values()
+        self.assertEqual(handler.out.output, b"")
+
+        self.service.print_job(make_job([{"type": "text", "value": "JOB-2"}]))
+        output = handler.p.output
+        self.assertNotIn(b"STALE-FROM-JOB-1", output)
+        self.assertIn(b"JOB-2", output)
+        # ESC t з відкинутого буфера не дійшов до принтера - шлемо знову
+        self.assertIn(b"\x1bt", output)
+
+
+class PrintJobCodepageTest(unittest.TestCase):
+    def setUp(self):
+        self.service = PrinterService()
+
+    def tearDown(self):
+        self.service.close_all()
+
+    def test_codepage_is_resent_for_every_job(self):
+        self.service.print_job(make_job([{"type": "text", "value": "JOB-1"}]))
+        (handler,) = self.service._handlers.values()
+        handler.p.clear()
+
+        self.service.print_job(make_job([{"type": "text", "value": "JOB-2"}]))
+        output = handler.p.output
+        self.assertIn(b"JOB-2", output)
+        self.assertIn(b"\x1bt", output)
+
+
+if __name__ == "__main__":
+    unittest.main()